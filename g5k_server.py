@@ -3,64 +3,174 @@ Extended Persistence Server using GUDHI
 Flask server that computes extended persistence for radial filtration on closed curves.
 
 To run locally:
-    pip install flask flask-cors gudhi numpy
-    python persistence_server.py
+    pip install -r requirements.txt
+    gunicorn -c gunicorn.conf.py g5k_server:app
 
-The server will run on http://localhost:5000
+The server will run on http://localhost:5000 with these endpoints:
+    GET  /health      - Health check
+    POST /persistence - Single center persistence
+    POST /vineyard    - Vineyard computation
 """
 
+import multiprocessing as mp
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
 from flask import Flask, request, jsonify
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
 import numpy as np
+import orjson
+from scipy.spatial.distance import cdist
 import gudhi as gd
 
+from persistence import (
+    DIAGRAM_COLUMNS, DIAGRAM_KEYS, build_simplex_tree, compute_vineyard_chunk,
+    process_extended_persistence, warmup,
+)
+
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson, with native numpy array support."""
+    option = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Skip the bytes -> str -> bytes round trip of the default response()
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=self.option), mimetype='application/json'
+        )
+
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+# Worker processes for the per-center vineyard computations. Under gunicorn
+# this is set per worker by gunicorn.conf.py; standalone it uses every core.
+POOL_WORKERS = int(os.environ.get('GUDHI_POOL_WORKERS', os.cpu_count() or 1))
+
+
+def get_pool():
+    """Return this process's vineyard pool, creating it on first use.
+
+    Workers are forked from a forkserver that has already imported the
+    persistence module (numpy and gudhi only), so they neither re-import
+    GUDHI nor load this Flask module to unpickle their tasks. Each worker
+    warms GUDHI up as it starts.
+    """
+    pool = app.extensions.get('gudhi_pool')
+    if pool is None:
+        mp_context = mp.get_context('forkserver')
+        mp_context.set_forkserver_preload(['persistence'])
+        pool = ProcessPoolExecutor(
+            max_workers=POOL_WORKERS, mp_context=mp_context, initializer=warmup
+        )
+        app.extensions['gudhi_pool'] = pool
+    return pool
+
+
+def discard_pool(pool):
+    """Drop a broken pool so the next get_pool() builds a fresh one."""
+    if app.extensions.get('gudhi_pool') is pool:
+        del app.extensions['gudhi_pool']
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_vineyard_chunks(chunks, all_distances, n, edges_u, edges_v, infinityY):
+    """Run compute_vineyard_chunk for each block of centers on the pool.
+
+    Returns the per-chunk column dicts in center order. If a pool process
+    dies (e.g. OOM-killed), the pool is rebuilt and the chunks retried once.
+    """
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            futures = [
+                pool.submit(compute_vineyard_chunk, all_distances[idx], int(idx[0]),
+                            n, edges_u, edges_v, infinityY)
+                for idx in chunks
+            ]
+            return [future.result() for future in futures]
+        except BrokenProcessPool:
+            discard_pool(pool)
+            if attempt:
+                raise
+            app.logger.warning('vineyard pool broken, rebuilding and retrying')
 
-def build_simplex_tree(coords, distances, curve_groups):
-    """Build a simplex tree for the curve with given distances."""
-    st = gd.SimplexTree()
-    n = len(coords)
+
+def extract_points(points, dtype=np.float32):
+    """Extract coordinates and curve labels from a list of point dicts.
+
+    Returns an (n, 2) coordinate array of the given dtype and an (n,) array
+    of dense curve labels (0 .. num_curves - 1) derived from curveId, in
+    first-seen order. Any hashable curveId works, as with a dict grouping.
+    """
+    n = len(points)
+    coords = np.fromiter(
+        (v for p in points for v in (p['x'], p['y'])),
+        dtype=dtype, count=2 * n
+    ).reshape(n, 2)
     
-    # Insert vertices
-    for i in range(n):
-        st.insert([i], filtration=float(distances[i]))
+    labels = {}
+    curve_ids = np.fromiter(
+        (labels.setdefault(p.get('curveId', 0), len(labels)) for p in points),
+        dtype=np.int64, count=n
+    )
+    
+    return coords, curve_ids
+
+
+# Upper bound on centers x points per block in the float32 distance kernel
+DISTANCE_BLOCK_SIZE = 1 << 18
+
+
+def center_distances(centers_arr, coords, use_squared):
+    """Distances from every center to every point, shape (num_centers, n).
+
+    float64 inputs go through cdist, which always computes in float64.
+    float32 inputs use direct differences, so the error stays relative even
+    for points close to a center. Centers are processed in blocks to bound
+    the (block, n, 2) temporary.
+    """
+    if coords.dtype == np.float64:
+        return cdist(centers_arr, coords, 'sqeuclidean' if use_squared else 'euclidean')
     
-    # Insert edges (closed loops for each curve)
-    for cid, indices in curve_groups.items():
-        m = len(indices)
-        for j in range(m):
-            v1 = indices[j]
-            v2 = indices[(j + 1) % m]
-            f_val = float(max(distances[v1], distances[v2]))
-            st.insert([v1, v2], filtration=f_val)
+    out = np.empty((len(centers_arr), len(coords)), dtype=coords.dtype)
+    block = max(1, DISTANCE_BLOCK_SIZE // max(len(coords), 1))
+    for start in range(0, len(centers_arr), block):
+        diff = centers_arr[start:start + block, np.newaxis, :] - coords[np.newaxis, :, :]
+        np.einsum('ijk,ijk->ij', diff, diff, out=out[start:start + block])
     
-    return st
+    return out if use_squared else np.sqrt(out, out=out)
 
 
-def process_extended_persistence(st, infinity_cap):
-    """Compute extended persistence and return categorized diagrams."""
-    st.extend_filtration()
-    dgms = st.extended_persistence()
+def curve_edges(curve_ids):
+    """Return the closed-loop edges of every curve as (edges_u, edges_v) arrays.
+
+    Points of a curve are connected in input order, and the last point of
+    each curve closes back to its first.
+    """
+    # Stable sort groups points by curve while keeping their input order
+    order = np.argsort(curve_ids, kind='stable')
+    sorted_ids = curve_ids[order]
     
-    # dgms[0] -> Ordinary, dgms[1] -> Relative, dgms[2] -> Extended+, dgms[3] -> Extended-
-    ord0, ord1, rel0, rel1, ext0, ext1 = [], [], [], [], [], []
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    ends = np.r_[starts[1:], len(order)] - 1
     
-    for dgm_idx, dgm in enumerate(dgms):
-        for dim, (birth, death) in dgm:
-            is_inf = bool(np.isinf(death))
-            d = float(death) if not is_inf else infinity_cap
-            b = float(birth)
-            
-            if dgm_idx == 0:  # Ordinary
-                (ord0 if dim == 0 else ord1).append([b, d])
-            elif dgm_idx == 1:  # Relative
-                (rel0 if dim == 0 else rel1).append([b, d])
-            else:  # Extended+ (2) and Extended- (3)
-                (ext0 if dim == 0 else ext1).append([b, d])
+    # Each point links to the next position, except curve ends wrap around
+    next_pos = np.arange(1, len(order) + 1)
+    next_pos[ends] = starts
     
-    return ord0, ord1, rel0, rel1, ext0, ext1
+    return order, order[next_pos]
 
 
 @app.route('/health', methods=['GET'])
@@ -78,6 +188,7 @@ def compute_persistence():
         center = data['center']
         points = data['points']
         use_squared = data.get('use_squared_distance', True)
+        dtype = np.float64 if data.get('use_fp64', False) else np.float32
         
         cx, cy = center['x'], center['y']
         n = len(points)
@@ -85,29 +196,20 @@ def compute_persistence():
         if n < 3:
             return jsonify({'error': 'Need at least 3 points'}), 400
         
-        # Group points by curve ID
-        curve_groups = {}
-        for i, pt in enumerate(points):
-            cid = pt.get('curveId', 0)
-            if cid not in curve_groups:
-                curve_groups[cid] = []
-            curve_groups[cid].append(i)
-        
-        # Compute distances using numpy
-        coords = np.array([[p['x'], p['y']] for p in points])
-        center_arr = np.array([cx, cy])
+        # Extract coordinates and curve labels
+        coords, curve_ids = extract_points(points, dtype)
+        center_arr = np.array([cx, cy], dtype=dtype)
         
-        if use_squared:
-            distances = np.sum((coords - center_arr)**2, axis=1)
-        else:
-            distances = np.linalg.norm(coords - center_arr, axis=1)
+        # Same kernel as /vineyard, so both endpoints agree for a given center
+        distances = center_distances(center_arr[np.newaxis], coords, use_squared)[0]
         
         r_min = float(np.min(distances))
         r_max = float(np.max(distances))
         infinity_cap = r_max * 1.5
         
         # Build simplex tree and compute
-        st = build_simplex_tree(coords, distances, curve_groups)
+        edges_u, edges_v = curve_edges(curve_ids)
+        st = build_simplex_tree(distances, edges_u, edges_v)
         ord0, ord1, rel0, rel1, ext0, ext1 = process_extended_persistence(st, infinity_cap)
         
         return jsonify({
@@ -118,6 +220,7 @@ def compute_persistence():
         })
         
     except Exception as e:
+        app.logger.exception('persistence failure')
         return jsonify({'error': str(e)}), 500
 
 
@@ -130,6 +233,7 @@ def compute_vineyard():
         centers = data['centers']
         points = data['points']
         use_squared = data.get('use_squared_distance', True)
+        dtype = np.float64 if data.get('use_fp64', False) else np.float32
         
         n = len(points)
         num_centers = len(centers)
@@ -138,79 +242,39 @@ def compute_vineyard():
             return jsonify({'error': 'Need at least 3 points'}), 400
         
         # Pre-extract data
-        coords = np.array([[p['x'], p['y']] for p in points])
-        centers_arr = np.array([[c['x'], c['y']] for c in centers])
-        
-        # Group points by curve ID
-        curve_groups = {}
-        for i, pt in enumerate(points):
-            cid = pt.get('curveId', 0)
-            if cid not in curve_groups:
-                curve_groups[cid] = []
-            curve_groups[cid].append(i)
-        
-        # Compute all distances at once (vectorized)
+        coords, curve_ids = extract_points(points, dtype)
+        centers_arr = np.array([[c['x'], c['y']] for c in centers], dtype=dtype)
+        
+        # Compute all distances at once
         # Shape: (num_centers, n)
-        diff = coords[np.newaxis, :, :] - centers_arr[:, np.newaxis, :]
-        if use_squared:
-            all_distances = np.sum(diff**2, axis=2)
-        else:
-            all_distances = np.linalg.norm(diff, axis=2)
+        all_distances = center_distances(centers_arr, coords, use_squared)
+        
+        # Edge topology is the same for every center (closed loop per curve)
+        edges_u, edges_v = curve_edges(curve_ids)
         
         max_dist_global = float(np.max(all_distances))
         infinityY = max_dist_global * 1.15
         
-        # Results
-        ord0_all, ord1_all = [], []
-        rel0_all, rel1_all = [], []
-        ext0_all, ext1_all = [], []
-        
-        for ci in range(num_centers):
-            distances = all_distances[ci]
-            
-            # Build simplex tree
-            st = build_simplex_tree(coords, distances, curve_groups)
-            
-            # Compute extended persistence
-            st.extend_filtration()
-            dgms = st.extended_persistence()
-            
-            # Process diagrams
-            for dgm_idx, dgm in enumerate(dgms):
-                for dim, (birth, death) in dgm:
-                    is_inf = bool(np.isinf(death))
-                    entry = {
-                        'birth': float(birth),
-                        'death': float(death) if not is_inf else infinityY,
-                        'centerIdx': ci,
-                        'isInfinite': is_inf,
-                        'type': ['ord', 'rel', 'ext', 'ext'][dgm_idx]
-                    }
-                    
-                    if dgm_idx == 0:  # Ordinary
-                        (ord0_all if dim == 0 else ord1_all).append(entry)
-                    elif dgm_idx == 1:  # Relative
-                        (rel0_all if dim == 0 else rel1_all).append(entry)
-                    else:  # Extended
-                        (ext0_all if dim == 0 else ext1_all).append(entry)
+        # Centers are independent: split them into one chunk per pool worker,
+        # each chunk builds its own base complex and returns its columns
+        chunks = [idx for idx in np.array_split(np.arange(num_centers), POOL_WORKERS) if len(idx)]
+        parts = run_vineyard_chunks(chunks, all_distances, n, edges_u, edges_v, infinityY)
         
-        return jsonify({
-            'ord0': ord0_all, 'ord1': ord1_all,
-            'rel0': rel0_all, 'rel1': rel1_all,
-            'ext0': ext0_all, 'ext1': ext1_all,
-            'infinityY': infinityY
-        })
+        # Results, one column per field (chunks are in center order)
+        result = {
+            key: {
+                name: np.concatenate([part[key][name] for part in parts])
+                for name in DIAGRAM_COLUMNS
+            }
+            for key in DIAGRAM_KEYS
+        }
+        result['infinityY'] = infinityY
+        
+        return jsonify(result)
         
     except Exception as e:
-        import traceback
-        return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
-
-
-if __name__ == '__main__':
-    print("Starting Extended Persistence Server...")
-    print("Endpoints:")
-    print("  GET  /health     - Health check")
-    print("  POST /persistence - Single center persistence")
-    print("  POST /vineyard    - Vineyard computation")
-    print()
-    app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
+        app.logger.exception('vineyard failure')
+        error = {'error': str(e)}
+        if app.debug:
+            error['trace'] = traceback.format_exc()
+        return jsonify(error), 500
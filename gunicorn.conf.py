@@ -0,0 +1,37 @@
+"""
+Gunicorn configuration for the Extended Persistence Server.
+
+Run with:
+    gunicorn -c gunicorn.conf.py g5k_server:app
+"""
+
+import os
+
+bind = '0.0.0.0:5000'
+
+# Two levels of processes share the cores: gunicorn workers serve requests
+# (and compute /persistence in-process), and each worker owns a pool that
+# runs /vineyard centers. Keep a few sync workers and split the cores
+# between their pools, so concurrent vineyards don't oversubscribe the
+# node. Override with -w / WEB_CONCURRENCY and GUDHI_POOL_WORKERS.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'sync'
+
+# Large vineyards can take several minutes
+timeout = 700
+
+
+def post_fork(server, worker):
+    """Size the worker's vineyard pool and warm up GUDHI before it serves.
+
+    The pool size is derived from the effective worker count (including a
+    -w override), and is read by g5k_server when the worker imports it.
+    The /vineyard pool processes are warmed separately by their pool
+    initializer (see g5k_server.get_pool).
+    """
+    pool_workers = max(1, (os.cpu_count() or 1) // server.cfg.workers)
+    os.environ.setdefault('GUDHI_POOL_WORKERS', str(pool_workers))
+
+    from persistence import warmup
+
+    warmup()
@@ -0,0 +1,128 @@
+"""
+GUDHI computations for the Extended Persistence Server.
+
+Kept free of Flask and the other server dependencies: this module is what the
+vineyard pool workers import, so it only pulls in numpy and gudhi.
+"""
+
+import numpy as np
+import gudhi as gd
+
+
+def warmup():
+    """Run a tiny extended persistence so GUDHI's lazy initialization happens
+    before the first real request in this process."""
+    st = gd.SimplexTree()
+    st.insert([0], filtration=0.0)
+    st.insert([1], filtration=1.0)
+    st.insert([0, 1], filtration=1.0)
+    st.extend_filtration()
+    st.extended_persistence()
+
+
+def build_simplex_tree(distances, edges_u, edges_v):
+    """Build a simplex tree for the curve with given distances."""
+    st = gd.SimplexTree()
+    
+    # Insert vertices
+    for i, f_val in enumerate(distances.tolist()):
+        st.insert([i], filtration=f_val)
+    
+    # Insert edges, filtered by the max of their endpoints
+    edge_filt = np.maximum(distances[edges_u], distances[edges_v])
+    for v1, v2, f_val in zip(edges_u.tolist(), edges_v.tolist(), edge_filt.tolist()):
+        st.insert([v1, v2], filtration=f_val)
+    
+    return st
+
+
+def build_base_tree(n, edges_u, edges_v):
+    """Build the curve complex once; only filtration values change per center."""
+    return build_simplex_tree(np.zeros(n), edges_u, edges_v)
+
+
+def assign_filtrations(st, distances, edges_u, edges_v):
+    """Overwrite vertex and edge filtrations of a tree from build_base_tree."""
+    for i, f_val in enumerate(distances.tolist()):
+        st.assign_filtration([i], f_val)
+    
+    # Edge values are the max of their endpoints, so no re-sorting is needed
+    edge_filt = np.maximum(distances[edges_u], distances[edges_v])
+    for v1, v2, f_val in zip(edges_u.tolist(), edges_v.tolist(), edge_filt.tolist()):
+        st.assign_filtration([v1, v2], f_val)
+
+
+# dgms[0] -> Ordinary, dgms[1] -> Relative, dgms[2] -> Extended+, dgms[3] -> Extended-
+DIAGRAM_PREFIXES = ('ord', 'rel', 'ext', 'ext')
+DIAGRAM_KEYS = ('ord0', 'ord1', 'rel0', 'rel1', 'ext0', 'ext1')
+DIAGRAM_COLUMNS = ('birth', 'death', 'centerIdx', 'isInfinite')
+
+
+def cap_infinite(deaths, infinity_cap):
+    """Replace infinite deaths by infinity_cap; also return the infinite mask."""
+    is_inf = np.isinf(deaths)
+    return np.where(is_inf, infinity_cap, deaths), is_inf
+
+
+def collect_diagram_rows(rows, dgms, ci):
+    """Append raw (centerIdx, dim, birth, death) rows from GUDHI diagrams to rows."""
+    for prefix, dgm in zip(DIAGRAM_PREFIXES, dgms):
+        rows[prefix] += [(ci, dim, birth, death) for dim, (birth, death) in dgm]
+
+
+def diagram_columns(rows, infinity_cap):
+    """Split collected rows by dimension and cap infinite deaths in one pass.
+
+    Returns a dict mapping each of DIAGRAM_KEYS to its DIAGRAM_COLUMNS arrays.
+    """
+    columns = {}
+    for prefix, prefix_rows in rows.items():
+        arr = np.array(prefix_rows, dtype=np.float64).reshape(-1, 4)
+        deaths, is_inf = cap_infinite(arr[:, 3], infinity_cap)
+        is_dim0 = arr[:, 1] == 0
+        for suffix, mask in (('0', is_dim0), ('1', ~is_dim0)):
+            columns[prefix + suffix] = {
+                'birth': arr[mask, 2],
+                'death': deaths[mask],
+                'centerIdx': arr[mask, 0].astype(np.int64),
+                'isInfinite': is_inf[mask],
+            }
+    
+    return columns
+
+
+def process_extended_persistence(st, infinity_cap):
+    """Compute extended persistence and return categorized (birth, death) arrays."""
+    st.extend_filtration()
+    dgms = st.extended_persistence()
+    
+    rows = {'ord': [], 'rel': [], 'ext': []}
+    collect_diagram_rows(rows, dgms, 0)
+    columns = diagram_columns(rows, infinity_cap)
+    
+    ord0, ord1, rel0, rel1, ext0, ext1 = (
+        np.column_stack((columns[key]['birth'], columns[key]['death']))
+        for key in DIAGRAM_KEYS
+    )
+    return ord0, ord1, rel0, rel1, ext0, ext1
+
+
+def compute_vineyard_chunk(distances_chunk, center_offset, n, edges_u, edges_v, infinityY):
+    """Compute the vineyard entries for a contiguous block of centers.
+
+    Runs in a pool worker, so it only takes picklable arrays. Returns a dict
+    mapping each of DIAGRAM_KEYS to its DIAGRAM_COLUMNS arrays.
+    """
+    rows = {'ord': [], 'rel': [], 'ext': []}
+    base_st = build_base_tree(n, edges_u, edges_v)
+    
+    for offset, distances in enumerate(distances_chunk):
+        # Reuse the base complex; extend_filtration mutates, so work on a copy
+        assign_filtrations(base_st, distances, edges_u, edges_v)
+        st = gd.SimplexTree(base_st)
+        
+        # Compute extended persistence
+        st.extend_filtration()
+        collect_diagram_rows(rows, st.extended_persistence(), center_offset + offset)
+    
+    return diagram_columns(rows, infinityY)
@@ -0,0 +1,135 @@
+"""
+Tests for the Extended Persistence Server endpoints.
+
+Results are checked against a direct GUDHI build of the same curve complex
+(the server's original per-point algorithm).
+
+Run with:
+    python -m pytest -q
+"""
+
+import math
+
+import gudhi as gd
+import numpy as np
+import pytest
+
+from g5k_server import app
+from persistence import DIAGRAM_COLUMNS, DIAGRAM_KEYS
+
+
+def make_points():
+    """Two noisy closed curves whose points are interleaved in the input."""
+    rng = np.random.default_rng(0)
+    curves = []
+    for cid, cx in ((7, 0.0), ('b', 3.0)):
+        t = np.linspace(0, 2 * np.pi, 24, endpoint=False)
+        r = 1 + 0.3 * np.sin(3 * t) + rng.normal(0, 0.02, t.size)
+        curves.append([
+            {'x': float(cx + rr * math.cos(tt)), 'y': float(rr * math.sin(tt)), 'curveId': cid}
+            for tt, rr in zip(t, r)
+        ])
+    return [p for pair in zip(*curves) for p in pair]
+
+
+POINTS = make_points()
+CENTERS = [{'x': 0.1, 'y': 0.2}, {'x': 1.5, 'y': -0.4}, {'x': 3.2, 'y': 0.5}]
+
+
+def reference_diagrams(points, center, use_squared, infinity_cap):
+    """Categorized (birth, death) pairs from a direct GUDHI build."""
+    groups = {}
+    for i, p in enumerate(points):
+        groups.setdefault(p.get('curveId', 0), []).append(i)
+    
+    dist = [(p['x'] - center['x']) ** 2 + (p['y'] - center['y']) ** 2 for p in points]
+    if not use_squared:
+        dist = [math.sqrt(d) for d in dist]
+    
+    st = gd.SimplexTree()
+    for i, d in enumerate(dist):
+        st.insert([i], filtration=d)
+    for indices in groups.values():
+        for j, v1 in enumerate(indices):
+            v2 = indices[(j + 1) % len(indices)]
+            st.insert([v1, v2], filtration=max(dist[v1], dist[v2]))
+    st.extend_filtration()
+    
+    result = {key: [] for key in DIAGRAM_KEYS}
+    for prefix, dgm in zip(('ord', 'rel', 'ext', 'ext'), st.extended_persistence()):
+        for dim, (birth, death) in dgm:
+            death = infinity_cap if np.isinf(death) else death
+            result[prefix + ('0' if dim == 0 else '1')].append((birth, death))
+    return result, max(dist)
+
+
+def assert_same_pairs(actual, expected, rtol):
+    actual = sorted(map(tuple, actual))
+    expected = sorted(expected)
+    assert len(actual) == len(expected)
+    if expected:
+        np.testing.assert_allclose(actual, expected, rtol=rtol, atol=1e-6)
+
+
+@pytest.fixture(scope='module')
+def client():
+    yield app.test_client()
+    # The vineyard pool runs on a forkserver; stop it with the test module
+    pool = app.extensions.pop('gudhi_pool', None)
+    if pool is not None:
+        pool.shutdown()
+
+
+@pytest.mark.parametrize('use_fp64, rtol', [(True, 1e-9), (False, 1e-5)])
+@pytest.mark.parametrize('use_squared', [True, False])
+def test_persistence_matches_gudhi(client, use_squared, use_fp64, rtol):
+    center = CENTERS[0]
+    resp = client.post('/persistence', json={
+        'center': center, 'points': POINTS,
+        'use_squared_distance': use_squared, 'use_fp64': use_fp64,
+    })
+    assert resp.status_code == 200
+    data = resp.get_json()
+    
+    _, r_max = reference_diagrams(POINTS, center, use_squared, 0.0)
+    expected, _ = reference_diagrams(POINTS, center, use_squared, r_max * 1.5)
+    assert data['r_max'] == pytest.approx(r_max, rel=rtol)
+    for key in DIAGRAM_KEYS:
+        assert_same_pairs(data[key], expected[key], rtol)
+
+
+@pytest.mark.parametrize('use_fp64, rtol', [(True, 1e-9), (False, 1e-5)])
+@pytest.mark.parametrize('use_squared', [True, False])
+def test_vineyard_matches_gudhi(client, use_squared, use_fp64, rtol):
+    resp = client.post('/vineyard', json={
+        'centers': CENTERS, 'points': POINTS,
+        'use_squared_distance': use_squared, 'use_fp64': use_fp64,
+    })
+    assert resp.status_code == 200
+    data = resp.get_json()
+    
+    # Columnar layout: one dict of equal-length columns per diagram key
+    assert set(data) == set(DIAGRAM_KEYS) | {'infinityY'}
+    for key in DIAGRAM_KEYS:
+        assert tuple(data[key]) == DIAGRAM_COLUMNS
+        assert len({len(column) for column in data[key].values()}) == 1
+    
+    max_dist = max(reference_diagrams(POINTS, c, use_squared, 0.0)[1] for c in CENTERS)
+    infinity_y = data['infinityY']
+    assert infinity_y == pytest.approx(max_dist * 1.15, rel=rtol)
+    
+    for ci, center in enumerate(CENTERS):
+        expected, _ = reference_diagrams(POINTS, center, use_squared, infinity_y)
+        for key in DIAGRAM_KEYS:
+            columns = data[key]
+            pairs = [
+                (b, d) for b, d, idx in zip(columns['birth'], columns['death'], columns['centerIdx'])
+                if idx == ci
+            ]
+            assert_same_pairs(pairs, expected[key], rtol)
+            assert not any(columns['isInfinite'])
+
+
+def test_requires_three_points(client):
+    resp = client.post('/vineyard', json={'centers': CENTERS, 'points': POINTS[:2]})
+    assert resp.status_code == 400